@@ -47,8 +47,7 @@
 """Extract and convert the images in the eyemodule database files
 into jpeg files"""
 
-import array, getopt, os, string, struct, sys, time, tempfile
-from types import IntType, StringType
+import collections, errno, getopt, io, mmap, multiprocessing, os, string, struct, subprocess, sys, time
 
 try:
     from PIL import Image
@@ -65,6 +64,13 @@ except ImportError:
                          "a non-standard location.\n\n")
         sys.exit(1)
     
+# NumPy is optional - without it the decoders fall back to slower
+# (but still allocation-free) bytearray loops
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 import PIL.JpegImagePlugin
 import PIL.PngImagePlugin
 import PIL.PpmImagePlugin
@@ -76,6 +82,46 @@ PIL.Image._initialized = 1
 # version info
 VERSION = "1.2"
 
+# the image viewer command, fed the encoded image on stdin
+VIEWER = "xv"
+
+# PIL format names of the supported file extensions
+_PIL_FORMATS = {"jpg": "JPEG", "png": "PNG", "ppm": "PPM", "tiff": "TIFF"}
+
+# translation table replacing characters unsuitable for filenames
+_FNAME_TRANS = string.maketrans("/\\:", "---")
+
+# pre-compiled struct formats - parsing the format string once instead of
+# on every struct.unpack call
+# record entry of the offset table: offset, attributes, unique id
+_REC_STRUCT = struct.Struct("> L B 3s")
+# 3-byte record unique id, zero padded to a long
+_UID_STRUCT = struct.Struct("> L")
+# image header: name, version, type, firstVGARecUID, noteUID, lastPosX,
+# lastPosY, created, anchorX, anchorY, width, height
+_HDR_STRUCT = struct.Struct("> 32s B B L L H H L H H H H")
+# number of records of a pdb file, at byte 76
+_REC_CNT_STRUCT = struct.Struct("> H")
+
+# a parsed image header - fixed-slot record, cheaper to build, cache and
+# access than a dict
+Header = collections.namedtuple("Header",
+                                ["Name", "version", "Type", "firstVGARecUID",
+                                 "noteUID", "lastPosX", "lastPosY", "created",
+                                 "anchorX", "anchorY", "Width", "Height"])
+
+# the EyeModule instance used by the extract_all_images worker processes -
+# set in the parent right before the pool forks, so the children inherit
+# the read-only mapped buffers instead of pickling them
+_POOL_EYEMODULE = None
+
+def _pool_extract_image(args):
+    """_pool_extract_image(args) -
+    extracts a single image in a worker process of extract_all_images"""
+
+    image_nr, format = args
+    _POOL_EYEMODULE.extract_image(image_nr, format)
+
 class EyeModule:
     """the EyeModule class - contains all the necessary methods to obtain images and image info"""
     
@@ -84,15 +130,16 @@ class EyeModule:
         contructor of the EyeModule class - takes an optional path to the directory argument
         which contains the eyemodule databases and an optional path to the directory containing the pdb files."""
 
-        assert (type(O_PATH) == StringType) and (type(P_PATH) == StringType)
-        
         # the header length of each image
         self.HEADER_LENGTH = 58
 
-        # initialize the file instances
-        self.__emDB_fd     = None
-        self.__emVGADB_fd  = None
-        self.__emNoteDB_fd = None
+        # initialize the file and buffer instances
+        self.__emDB_fd      = None
+        self.__emVGADB_fd   = None
+        self.__emNoteDB_fd  = None
+        self.__emDB_buf     = None
+        self.__emVGADB_buf  = None
+        self.__emNoteDB_buf = None
 
         # sanity checks if directory exists and if yes if it is a directory
         if not os.path.exists(O_PATH):
@@ -110,82 +157,106 @@ class EyeModule:
              not os.path.exists(os.path.join(P_PATH, "eyemoduleNoteDB.pdb")):
             raise Exception("Could not find the necessary .pdb files!\n")
 
-        # change to the directory where the images should be extracted to
-        os.chdir(O_PATH)
+        # remember the directory where the images should be extracted to -
+        # all output paths are built absolute, no chdir needed
+        self.__out_root = os.path.abspath(O_PATH)
 
         # set the current image number to zero
         self.__cur_image = 0
 
-        # open the *DB.pdb files for reading
+        # cache of already parsed image headers keyed by image number
+        self.__header_cache = {}
+
+        # open the *DB.pdb files and map them read-only into memory -
+        # all further accesses are plain buffer slices instead of seek/read
         print os.path.join(P_PATH, "eyemoduleDB.pdb")
-        self.__emDB_fd     = open(os.path.join(P_PATH, "eyemoduleDB.pdb"), "r")
-        self.__emVGADB_fd  = open(os.path.join(P_PATH, "eyemoduleVGADB.pdb"), "r")
-        self.__emNoteDB_fd = open(os.path.join(P_PATH, "eyemoduleNoteDB.pdb"), "r")
-
-        # go to byte 52 containing the location of the appinfo in the pdb file
-        # read the next 4 bytes
-        self.__emDB_fd.seek(52)
-        appinfo_start = struct.unpack("> L", self.__emDB_fd.read(4))[0]
-
-        # go to byte 76 containing the number of records in the DB file
-        # read the next 2 bytes
-        self.__emDB_fd.seek(76)
-        self.__record_cnt = struct.unpack("> 2s", self.__emDB_fd.read(2))
-        self.__record_cnt = self.__str_to_Word(self.__record_cnt[0])
-        
+        self.__emDB_fd     = open(os.path.join(P_PATH, "eyemoduleDB.pdb"), "rb")
+        self.__emVGADB_fd  = open(os.path.join(P_PATH, "eyemoduleVGADB.pdb"), "rb")
+        self.__emNoteDB_fd = open(os.path.join(P_PATH, "eyemoduleNoteDB.pdb"), "rb")
+
+        self.__emDB_buf     = mmap.mmap(self.__emDB_fd.fileno(), 0,
+                                        access=mmap.ACCESS_READ)
+        self.__emVGADB_buf  = mmap.mmap(self.__emVGADB_fd.fileno(), 0,
+                                        access=mmap.ACCESS_READ)
+        self.__emNoteDB_buf = mmap.mmap(self.__emNoteDB_fd.fileno(), 0,
+                                        access=mmap.ACCESS_READ)
+
+        # byte 52 contains the location of the appinfo in the pdb file
+        appinfo_start = struct.unpack_from("> L", self.__emDB_buf, 52)[0]
+
+        # byte 76 contains the number of records in the DB file
+        self.__record_cnt = _REC_CNT_STRUCT.unpack_from(self.__emDB_buf, 76)[0]
+
         # create an empty record data offsets dict
-        self.__rec_data_offset_dict = {}
+        rec_data_offset_dict = {}
 
         # get the record data offsets and corresponding categories
-        # a category is represented by the least significant four bits 
+        # a category is represented by the least significant four bits
         for i in range(self.__record_cnt):
-            rec_data = struct.unpack("> L B 3s", self.__emDB_fd.read(8))
-            self.__rec_data_offset_dict[rec_data[0]] = (rec_data[1] & 0x0F)
+            rec_data = _REC_STRUCT.unpack_from(self.__emDB_buf, 78 + i * 8)
+            rec_data_offset_dict[rec_data[0]] = (rec_data[1] & 0x0F)
 
         # create the image list and sort it
-        self.__images = self.__rec_data_offset_dict.keys()
+        self.__images = rec_data_offset_dict.keys()
         self.__images.sort()
-        
-        # get the names of the categories
+
+        # get the names of the categories - one slice of the appinfo block,
+        # scanned in 16 byte windows up to the first unused entry
         self.__category_names = []
-        self.__emDB_fd.seek(appinfo_start + 2)
-        category = self.__emDB_fd.read(16)
-        
-        while ord(category[0]) != 0 and self.__emDB_fd.tell() < self.__images[0]:
-            self.__category_names.append(category[:string.index(category, "\0")])
-            category = self.__emDB_fd.read(16)
+        cat_region = self.__emDB_buf[appinfo_start + 2:self.__images[0]]
+
+        for pos in range(0, len(cat_region) - 16, 16):
+            if cat_region[pos] == "\0":
+                break
+            self.__category_names.append(cat_region[pos:pos + 16].split("\0", 1)[0])
 
-        # go to byte 76 containing the number of records in the VGADB file
-        # read the next 2 bytes
-        self.__emVGADB_fd.seek(76)
-        self.__vga_record_cnt = struct.unpack("> 2s", self.__emVGADB_fd.read(2))
-        self.__vga_record_cnt = self.__str_to_Word(self.__vga_record_cnt[0])
+        # byte 76 contains the number of records in the VGADB file
+        self.__vga_record_cnt = _REC_CNT_STRUCT.unpack_from(self.__emVGADB_buf, 76)[0]
 
         # create an empty record data offsets dict for the color images
-        self.__rec_data_offset_vga_dict = {}
+        rec_data_offset_vga_dict = {}
 
         # get the record data offsets of the color images - step by 24 as
-        # every color image is made up of 24 records
+        # every color image is made up of 24 records, so only the first
+        # record of each image is of interest
         for i in range(0, self.__vga_record_cnt, 24):
-            rec_data = struct.unpack("> L B 3s", self.__emVGADB_fd.read(8))
-            self.__rec_data_offset_vga_dict[self.__str_to_Long(rec_data[2])] = rec_data[0]
+            rec_data = _REC_STRUCT.unpack_from(self.__emVGADB_buf, 78 + i * 8)
+            uid = _UID_STRUCT.unpack("\0" + rec_data[2])[0]
+            rec_data_offset_vga_dict[uid] = rec_data[0]
 
-            # go to the next image record - bypass 184=24*8-8 bytes
-            self.__emVGADB_fd.seek(self.__emVGADB_fd.tell() + 184)
+        # byte 76 contains the number of records in the NoteDB file
+        self.__note_record_cnt = _REC_CNT_STRUCT.unpack_from(self.__emNoteDB_buf, 76)[0]
 
-        # go to byte 76 containing the number of records in the NoteDB file
-        # read the next 2 bytes
-        self.__emNoteDB_fd.seek(76)
-        self.__note_record_cnt = struct.unpack("> 2s", self.__emNoteDB_fd.read(2))
-        self.__note_record_cnt = self.__str_to_Word(self.__note_record_cnt[0])
-
-        # create an empty record data offsets dict for the color images
-        self.__rec_data_offset_note_dict = {}
+        # create an empty record data offsets dict for the notes
+        rec_data_offset_note_dict = {}
 
         # get the record data offsets of the notes
         for i in range(self.__note_record_cnt):
-            rec_data = struct.unpack("> L B 3s", self.__emNoteDB_fd.read(8))
-            self.__rec_data_offset_note_dict[self.__str_to_Long(rec_data[2])] = rec_data[0]
+            rec_data = _REC_STRUCT.unpack_from(self.__emNoteDB_buf, 78 + i * 8)
+            uid = _UID_STRUCT.unpack("\0" + rec_data[2])[0]
+            rec_data_offset_note_dict[uid] = rec_data[0]
+
+        # flatten the nested lookups into parallel lists indexed by the
+        # image number, so the hot paths do a single list index instead of
+        # chained dict lookups
+        self.__img_categories   = []
+        self.__img_vga_offsets  = []
+        self.__img_note_offsets = []
+
+        for offset in self.__images:
+            self.__img_categories.append(
+                self.__category_names[rec_data_offset_dict[offset]])
+
+            # peek at the VGA and note record UIDs of the image header
+            header_tuple = _HDR_STRUCT.unpack_from(self.__emDB_buf, offset)
+            self.__img_vga_offsets.append(
+                rec_data_offset_vga_dict.get(header_tuple[3]))
+            self.__img_note_offsets.append(
+                rec_data_offset_note_dict.get(header_tuple[4]))
+
+        # precompute the absolute category directory of every image
+        self.__img_category_dirs = [os.path.join(self.__out_root, category)
+                                    for category in self.__img_categories]
 
 
     def __del__(self):
@@ -194,7 +265,19 @@ class EyeModule:
 
 
     def cleanup(self):
-        """close(self) - close the database files"""
+        """close(self) - close the database files and release the buffers"""
+        if self.__emDB_buf:
+            self.__emDB_buf.close()
+            self.__emDB_buf = None
+
+        if self.__emVGADB_buf:
+            self.__emVGADB_buf.close()
+            self.__emVGADB_buf = None
+
+        if self.__emNoteDB_buf:
+            self.__emNoteDB_buf.close()
+            self.__emNoteDB_buf = None
+
         if self.__emDB_fd:
             self.__emDB_fd.close()
 
@@ -205,83 +288,110 @@ class EyeModule:
             self.__emNoteDB_fd.close()
 
 
-    def __str_to_Word(self, str):
-        """__str_to_Word(self, str) -> word
-        converts a 2-byte string into a word"""
-
-        assert type(str) == StringType and len(str) == 2
-        
-        return (ord(str[0]) << 8) + ord(str[1])
-
-
-    def __str_to_Long(self, str):
-        """__str_to_Long(self, str) -> word
-        converts a 3 or 4-byte string into a long"""
-
-        assert type(str) == StringType and (len(str) == 3 or len(str) == 4)
-
-        if len(str) == 3:
-            return long((ord(str[0]) << 16) + (ord(str[1]) << 8) + ord(str[2]))
-        else:
-            return long((ord(str[0]) << 24) + (ord(str[1]) << 16) + \
-                   (ord(str[2]) << 8)  + ord(str[3]))
-    
-
     def _decode_image_Grayscale(self, img_data, img_width, img_height):
         """_decode_image_Grayscale(self, img_data, img_width, img_height) -> Image
         decodes given _grayscale_ image"""
 
-        assert type(img_data)   == StringType
-        assert type(img_width)  == IntType
-        assert type(img_height) == IntType
-
-        # create a new Image with 8bit grayscale color
-        image = PIL.Image.new("L", (img_width, img_height))
-
-        # array to store the RGB pixel values into
-        img_array = array.array('B')
-
-        for value in img_data:
-            pixel1 = 255 - (ord(value) & 0xF0) 
-            pixel2 = 255 - ((ord(value) & 0x0F) << 4)
+        if numpy is not None:
+            # expand every nibble pair to two pixels at once instead of
+            # looping over the input byte by byte
+            values = numpy.frombuffer(img_data, dtype=numpy.uint8)
+            img_array = numpy.empty(values.size * 2, dtype=numpy.uint8)
+            img_array[0::2] = 255 - (values & 0xF0)
+            img_array[1::2] = 255 - ((values & 0x0F) << 4)
+        else:
+            # fall back to a preallocated bytearray written in place
+            img_array = bytearray(len(img_data) * 2)
+            pos = 0
+            for value in img_data:
+                value = ord(value)
+                img_array[pos]     = 255 - (value & 0xF0)
+                img_array[pos + 1] = 255 - ((value & 0x0F) << 4)
+                pos = pos + 2
 
-            img_array.fromlist([pixel1, pixel2])
-            
-        return PIL.Image.frombytes("L", (img_width, img_height), img_array.tostring())
+        # frombuffer shares the memory of img_array instead of copying it
+        return PIL.Image.frombuffer("L", (img_width, img_height),
+                                    img_array, "raw", "L", 0, 1)
 
 
     def _decode_image_Color(self, img_data, img_width, img_height):
         """_decode_image_Color(img_data, img_width, img_height) -> Image
         decodes given _color_ image"""
 
-        assert type(img_data)   == StringType
-        assert type(img_width)  == IntType
-        assert type(img_height) == IntType
+        if numpy is not None:
+            # view the data as records of 1601 4-byte chunks and drop the
+            # leading pdb list info chunk of each record, leaving the
+            # U Y1 V Y2 quadruples for 2 pixels each
+            chunks = numpy.frombuffer(img_data, dtype=numpy.uint8)
+            chunks = chunks.reshape(-1, 6404)[:, 4:].reshape(-1, 4)
+
+            # reshuffle each quadruple into the 6 YCbCr bytes of 2 pixels
+            img_array = numpy.empty((chunks.shape[0], 6), dtype=numpy.uint8)
+            img_array[:, 0] = chunks[:, 1]  # Y1
+            img_array[:, 1] = chunks[:, 0]  # U
+            img_array[:, 2] = chunks[:, 2]  # V
+            img_array[:, 3] = chunks[:, 3]  # Y2
+            img_array[:, 4] = chunks[:, 0]  # U
+            img_array[:, 5] = chunks[:, 2]  # V
+        else:
+            # fall back to a preallocated bytearray written in place -
+            # 1600 quadruples of image data per 6404 byte record, 6 YCbCr
+            # bytes per quadruple
+            img_array = bytearray((len(img_data) // 6404) * 1600 * 6)
+            out = 0
+            for pos in xrange(4, len(img_data), 4):
+                # skip pdb list info
+                if not pos % 6404:
+                    continue
+
+                # get the YUV information for 2 pixels
+                U, Y1, V, Y2 = ord(img_data[pos]),     ord(img_data[pos + 1]), \
+                               ord(img_data[pos + 2]), ord(img_data[pos + 3])
+
+                img_array[out]     = Y1
+                img_array[out + 1] = U
+                img_array[out + 2] = V
+                img_array[out + 3] = Y2
+                img_array[out + 4] = U
+                img_array[out + 5] = V
+                out = out + 6
+
+        # frombuffer shares the memory of img_array instead of copying it
+        img = PIL.Image.frombuffer("YCbCr", (img_width, img_height),
+                                   img_array, "raw", "YCbCr", 0, 1)
 
-        # array to store the RGB pixel values into
-        img_array = array.array('B')
+        return img.convert("RGB")
 
-        for pos in xrange(4, len(img_data), 4):
-            # skip pdb list info
-            if not pos % 6404:
-                continue
 
-            # get the YUV information for 2 pixels
-            U, Y1, V, Y2 = ord(img_data[pos]),     ord(img_data[pos + 1]), \
-                           ord(img_data[pos + 2]), ord(img_data[pos + 3])
+    def _decode_image_Color_320x240(self, img_data):
+        """_decode_image_Color_320x240(self, img_data) -> Image
+        decodes the standard 320x240 _color_ image - all shapes are fixed
+        constants (24 records of 1601 4-byte chunks, 38400 pixel pairs)"""
 
-            img_array.fromlist([Y1,U,V,Y2,U,V])
+        # drop the leading pdb list info chunk of each record, leaving the
+        # U Y1 V Y2 quadruples for 2 pixels each
+        chunks = numpy.frombuffer(img_data, dtype=numpy.uint8)
+        chunks = chunks.reshape(24, 1601, 4)[:, 1:, :].reshape(38400, 4)
+
+        # reshuffle each quadruple into the 6 YCbCr bytes of 2 pixels
+        img_array = numpy.empty((38400, 6), dtype=numpy.uint8)
+        img_array[:, 0] = chunks[:, 1]  # Y1
+        img_array[:, 1] = chunks[:, 0]  # U
+        img_array[:, 2] = chunks[:, 2]  # V
+        img_array[:, 3] = chunks[:, 3]  # Y2
+        img_array[:, 4] = chunks[:, 0]  # U
+        img_array[:, 5] = chunks[:, 2]  # V
+
+        img = PIL.Image.frombuffer("YCbCr", (320, 240),
+                                   img_array, "raw", "YCbCr", 0, 1)
 
-        img = PIL.Image.frombytes("YCbCr", (img_width, img_height), img_array.tostring())
-        
         return img.convert("RGB")
 
 
     def get_header(self, image_nr = -1):
-        """get_header(self, image_nr) -> header_dict
-        extracts the header information from the given image number and returns a dictionary"""
-
-        assert type(image_nr) == IntType
+        """get_header(self, image_nr) -> Header
+        extracts the header information from the given image number and
+        returns a Header namedtuple"""
 
         if image_nr == -1:
             image_nr = self.__cur_image
@@ -290,61 +400,47 @@ class EyeModule:
         else:
             return None
 
-        # get the header from the eyemoduleDB.pdb file
-        self.__emDB_fd.seek(self.__images[image_nr])
-        header = self.__emDB_fd.read(self.HEADER_LENGTH)
-        
-        # create the header dictionary
-        header_dict = {}
-
-        # create a header tuple from the header in big endian order
-        header_tuple = struct.unpack("> 32s B B L L 2s 2s L 2s 2s 2s 2s", header)
-
-        # get the name of the image as it appears in the image list
-        header_dict["Name"] = header_tuple[0][:string.index(header_tuple[0], "\0")]
-
-        # get the version number
-        header_dict["version"] = header_tuple[1]
-
-        # get the type
-        header_dict["Type"] = header_tuple[2]
-
-        # 0 if no VGA data
-        header_dict["firstVGARecUID"] = header_tuple[3]
+        # return the already parsed header if we have seen this image before
+        if image_nr in self.__header_cache:
+            return self.__header_cache[image_nr]
 
-        # 0 if no note text
-        header_dict["noteUID"] = header_tuple[4]
+        # create a header tuple from the header in big endian order,
+        # straight out of the mapped eyemoduleDB.pdb buffer
+        header_tuple = _HDR_STRUCT.unpack_from(self.__emDB_buf, self.__images[image_nr])
 
-        # Scrolled X position
-        header_dict["lastPosX"] = self.__str_to_Word(header_tuple[5])
-
-        # Scrolled Y position
-        header_dict["lastPosY"] = self.__str_to_Word(header_tuple[6])
-
-        # Date/Time created (seconds since 1/1/1904)
+        # the creation date is stored in seconds since 1/1/1904
         time_Offset = long(time.mktime((1904, 1, 1, 0, 0, 0, 0, 0, 0)))
-        header_dict["created"] = time.ctime(header_tuple[7] + time_Offset)
-
-        # 0xFFFF = No anchor
-        header_dict["anchorX"] = self.__str_to_Word(header_tuple[8])
-
-        # 0xFFFF = No anchor
-        header_dict["anchorY"] = self.__str_to_Word(header_tuple[9])
-
-        # Width of image in pixels, word aligned (320)
-        header_dict["Width"] = self.__str_to_Word(header_tuple[10])
-
-        # Height of image in pixels (240)
-        header_dict["Height"] = self.__str_to_Word(header_tuple[11])
-
-        return header_dict
-
-
-    def get_image(self, image_nr = -1):
-        """get_image(self, image_nr) -> Image
-        extracts the desired image and returns it"""
 
-        assert type(image_nr) == IntType
+        header = Header(
+            # name of the image as it appears in the image list
+            Name = header_tuple[0][:string.index(header_tuple[0], "\0")],
+            version = header_tuple[1],
+            Type = header_tuple[2],
+            # 0 if no VGA data
+            firstVGARecUID = header_tuple[3],
+            # 0 if no note text
+            noteUID = header_tuple[4],
+            # scrolled X/Y position
+            lastPosX = header_tuple[5],
+            lastPosY = header_tuple[6],
+            created = time.ctime(header_tuple[7] + time_Offset),
+            # 0xFFFF = No anchor
+            anchorX = header_tuple[8],
+            anchorY = header_tuple[9],
+            # width of image in pixels, word aligned (320)
+            Width = header_tuple[10],
+            # height of image in pixels (240)
+            Height = header_tuple[11])
+
+        self.__header_cache[image_nr] = header
+
+        return header
+
+
+    def get_image(self, image_nr = -1, header = None):
+        """get_image(self, image_nr, header) -> Image
+        extracts the desired image and returns it - takes an optional already
+        parsed header to avoid fetching it again"""
 
         if image_nr == -1:
             image_nr = self.__cur_image
@@ -353,34 +449,38 @@ class EyeModule:
         else:
             return None
 
-        header = self.get_header(self.__cur_image)
+        if header is None:
+            header = self.get_header(self.__cur_image)
 
         # calculates the byte length of the picture
-        img_length = (header["Width"] * header["Height"])
+        img_length = (header.Width * header.Height)
 
         # output some information
-        sys.stdout.write(`image_nr + 1` + ". " + header["Name"] + \
-                         "  (" + `header["Width"]` + "x" + `header["Height"]` + ")" + \
-                         "  Cat: " + self.__category_names[self.__rec_data_offset_dict[self.__images[image_nr]]] + \
-                         "  created: " + `header["created"]` + "\n")
+        sys.stdout.write(`image_nr + 1` + ". " + header.Name + \
+                         "  (" + `header.Width` + "x" + `header.Height` + ")" + \
+                         "  Cat: " + self.__img_categories[image_nr] + \
+                         "  created: " + `header.created` + "\n")
 
         # check if it is a colored image
-        if header["firstVGARecUID"]:
-            # go to the position of the desired image
-            self.__emVGADB_fd.seek(self.__rec_data_offset_vga_dict[header["firstVGARecUID"]])
-
+        if header.firstVGARecUID:
             # get the data for a 320x240 color image - i.e. 153696=(320*240)*2+24*4 bytes
-            img_data = self.__emVGADB_fd.read(153696)
+            img_start = self.__img_vga_offsets[image_nr]
+            img_data = self.__emVGADB_buf[img_start:img_start + 153696]
+
+            # decode a color image - take the specialized path for the
+            # standard geometry
+            if numpy is not None and \
+               header.Width == 320 and header.Height == 240 and \
+               len(img_data) == 153696:
+                return self._decode_image_Color_320x240(img_data)
 
-            # decode a color image
-            return self._decode_image_Color(img_data, header["Width"], header["Height"])
+            return self._decode_image_Color(img_data, header.Width, header.Height)
         else:
-            # go to the position of the desired image
-            self.__emDB_fd.seek(self.__images[image_nr] + self.HEADER_LENGTH)
-            img_data = self.__emDB_fd.read(img_length / 2)
+            img_start = self.__images[image_nr] + self.HEADER_LENGTH
+            img_data = self.__emDB_buf[img_start:img_start + img_length / 2]
 
             # decode a grayscale image
-            return self._decode_image_Grayscale(img_data, header["Width"], header["Height"])
+            return self._decode_image_Grayscale(img_data, header.Width, header.Height)
 
 
     def max_image_nr(self):
@@ -427,9 +527,6 @@ class EyeModule:
         """view_image(self, image_nr, format) -
         show the desired image in the desired format"""
 
-        assert type(image_nr) == IntType
-        assert type(format)   == StringType
-
         if image_nr == -1:
             image_nr = self.__cur_image
         elif image_nr < self.__record_cnt:
@@ -437,32 +534,28 @@ class EyeModule:
         else:
             return None
 
-        im = self.get_image(image_nr)
-        file = tempfile.mktemp()
-        im.save(file + "." + format)
-        os.system("(%s %s.%s; rm -f %s.%s)&" % ("xv", file, format, file, format))
+        # encode the image in memory and pipe it to the viewer - no temp
+        # file, no shell
+        img_buf = io.BytesIO()
+        self.get_image(image_nr).save(img_buf, _PIL_FORMATS[format])
+
+        viewer = subprocess.Popen([VIEWER, "-"], stdin=subprocess.PIPE)
+        viewer.stdin.write(img_buf.getvalue())
+        viewer.stdin.close()
 
 
     def view_all_images(self, format = "jpg"):
         """view_all_images(self, format) -
         shows all images in the desired format"""
 
-        assert type(format) == StringType
-
         for image_nr in range(self.max_image_nr()):
-            im = self.get_image(image_nr)
-            file = tempfile.mktemp()
-            im.save(file + "." + format)
-            os.system("(%s %s.%s; rm -f %s.%s)&" % ("xv", file, format, file, format))
+            self.view_image(image_nr, format)
 
 
     def extract_image(self, image_nr = -1, format = "jpg"):
         """extract_image(self, image_nr, format) -
         extracts the desired image in the desired format"""
 
-        assert type(image_nr) == IntType
-        assert type(format)   == StringType
-
         if image_nr == -1:
             image_nr = self.__cur_image
         elif image_nr < self.__record_cnt:
@@ -473,52 +566,56 @@ class EyeModule:
         # get the header
         header = self.get_header(image_nr)
 
-        # get the name of the category
-        category = self.__category_names[self.__rec_data_offset_dict[self.__images[image_nr]]]
+        # get the directory of the category
+        category_dir = self.__img_category_dirs[image_nr]
 
-        # check if the category directory already exists
-        if not os.path.exists(category):
+        # check if the category directory already exists - another worker
+        # process may have created it in the meantime
+        if not os.path.exists(category_dir):
             try:
-                os.mkdir(category)
-            except Exception, error:
-                raise Exception(str(error) + "\n")
-
-        # change into it
-        os.chdir(category)
+                os.mkdir(category_dir)
+            except OSError, error:
+                if error.errno != errno.EEXIST:
+                    raise Exception(str(error) + "\n")
 
         # some conversions for correct filename handling
-        filename = string.replace(header["Name"], "/", "-")
-        filename = string.replace(filename, "\\", "-")
-        filename = string.replace(filename, ":", "-")
+        filename = header.Name.translate(_FNAME_TRANS)
 
         try:
             # check if the image has a note attached and extract it
-            if header["noteUID"]:
-                # go to the position of the desired note
-                self.__emNoteDB_fd.seek(self.__rec_data_offset_note_dict[header["noteUID"]])
-                note_fd = open(header["Name"] + ".txt", "w")
-
-                # extract the text
-                c = self.__emNoteDB_fd.read(1)
-                while c != "\0":
-                    note_fd.write(c)
-                    c = self.__emNoteDB_fd.read(1)
+            if header.noteUID:
+                # the note is a null terminated string - write it in one go
+                note_start = self.__img_note_offsets[image_nr]
+                note_end = self.__emNoteDB_buf.find("\0", note_start)
 
+                note_fd = open(os.path.join(category_dir, header.Name + ".txt"), "w")
+                note_fd.write(self.__emNoteDB_buf[note_start:note_end])
                 note_fd.close()
-            
-            self.get_image(image_nr).save(filename + "." + format)
+
+            self.get_image(image_nr, header).save(
+                os.path.join(category_dir, filename + "." + format))
         except Exception, error:
             raise Exception(str(error) + "\n")
 
-        os.chdir("..")
-
 
     def extract_all_images(self, format = "jpg"):
         """extract_all_images(self, format) -
-        extracts all images in the desired format"""
+        extracts all images in the desired format, one worker process per cpu"""
 
-        for image_nr in range(self.max_image_nr()):
-            self.extract_image(image_nr, format)
+        global _POOL_EYEMODULE
+
+        # decode and encode of the images are independent of each other -
+        # spread them over all cpus
+        _POOL_EYEMODULE = self
+        pool = multiprocessing.Pool(multiprocessing.cpu_count())
+
+        try:
+            pool.map(_pool_extract_image,
+                     [(image_nr, format) for image_nr in range(self.max_image_nr())])
+        finally:
+            pool.close()
+            pool.join()
+            _POOL_EYEMODULE = None
 
     def list_images(self):
         """list_images(self) -
@@ -529,10 +626,10 @@ class EyeModule:
         for image_nr in range(self.max_image_nr()):
             header = self.get_header(image_nr)
             # output some information
-            sys.stdout.write(`image_nr + 1` + ". " + header["Name"] + \
-                             " (" + `header["Width"]` + "x" + `header["Height"]` + ")" + \
-                             " Cat: " + self.__category_names[self.__rec_data_offset_dict[self.__images[image_nr]]] + \
-                             " created: " + `header["created"]` + "\n")
+            sys.stdout.write(`image_nr + 1` + ". " + header.Name + \
+                             " (" + `header.Width` + "x" + `header.Height` + ")" + \
+                             " Cat: " + self.__img_categories[image_nr] + \
+                             " created: " + `header.created` + "\n")
 
         sys.stdout.write("\n")
 
@@ -560,62 +657,65 @@ def create_thumbnail_index(O_PATH):
     sys.stdout.write("\nCreating thumbnail index... ")
 
     os.chdir(O_PATH)
-    index_fd = open("eyemodule.html", "w")
 
-    # create the HTML main index header
-    index_fd.write(
+    # collect the HTML main index in memory, starting with the header
+    index_parts = [
         "<!DOCTYPE HTML PUBLIC \"-//W3C//DTD HTML 4.0 Transitional//EN\">\n"
         "<HTML>\n\t<HEAD>\n\t\t<TITLE>EyeModule Thumbnail Index</TITLE>\n"
         "\t\t<meta name=\"generator\" content=\"eyemodule.py " + VERSION + " by Tamer Fahmy\">\n"
         "\t</HEAD>\n\n\n"
         "<BODY bgcolor=\"#c0c0c0\" text=\"#000000\">\n\n"
-        "<div align=\"center\">\n\t<H1>EyeModule Thumbnail Index</H1><HR><BR>\n</div>\n\n<UL>\n")
+        "<div align=\"center\">\n\t<H1>EyeModule Thumbnail Index</H1><HR><BR>\n</div>\n\n<UL>\n"]
 
     # create the entries for each directory (category)
     for directory in os.listdir(os.getcwd()):
-        if os.path.isdir(directory):            
-            # count the images in the directory and create a image index in
-            # this directory
+        if os.path.isdir(directory):
+            # count the images in the directory and collect the image index
+            # of this directory, starting with the header
             img_cnt = 0
-            category_fd = open(os.path.join(directory, "eyemodule_img.html"), "w")
-
-            # create the HTML category index header
-            category_fd.write(
+            category_parts = [
                 "<!DOCTYPE HTML PUBLIC \"-//W3C//DTD HTML 4.0 Transitional//EN\">\n"
                 "<HTML>\n<HEAD>\n\t<TITLE>EyeModule Category: " + directory + "</TITLE>\n"
                 "\t<meta name=\"generator\" content=\"eyemodule.py " + VERSION + " by Tamer Fahmy\">\n"
                 "</HEAD>\n\n\n"
                 "<BODY bgcolor=\"#c0c0c0\" text=\"#000000\">\n\n"
-                "<div align=\"center\">\n\t<H1>EyeModule Category " + directory + "</H1><HR><BR>\n</div>\n\n<OL>\n")
-            
+                "<div align=\"center\">\n\t<H1>EyeModule Category " + directory + "</H1><HR><BR>\n</div>\n\n<OL>\n"]
+
             for file in os.listdir(directory):
-                if os.path.splitext(file)[1] in (".jpg", ".png", ".ppm", ".tiff"):
+                if file.endswith((".jpg", ".png", ".ppm", ".tiff")):
                     img_cnt = img_cnt + 1
                     # insert an image
-                    category_fd.write("<LI><img src=\"" + file + "\" alt=\"" + file + "\"><BR>\n" + file + " (" + \
-                                      `os.path.getsize(os.path.join(directory, file))` + " bytes)<BR><BR></LI>\n")
+                    category_parts.append("<LI><img src=\"" + file + "\" alt=\"" + file + "\"><BR>\n" + file + " (" + \
+                                          `os.path.getsize(os.path.join(directory, file))` + " bytes)<BR><BR></LI>\n")
 
-            # create the HTML category index footer
-            category_fd.write(
+            # append the HTML category index footer
+            category_parts.append(
                 "</OL>\n\n<HR>"
                 "<a href=\"http://www.tammura.at/eyemodule\">eyemodule.py</a> " + VERSION + " "
                 "by Tamer Fahmy on " + time.asctime(time.localtime(time.time())) + \
                 "\n\n</BODY>\n</HTML>")
-            
+
+            # write the category index in one go through a large buffer
+            category_fd = open(os.path.join(directory, "eyemodule_img.html"),
+                               "w", 1 << 20)
+            category_fd.write("".join(category_parts))
             category_fd.close()
 
             # insert an entry
-            index_fd.write(
+            index_parts.append(
                 "<LI>Category: <a href=\"" + directory + "/eyemodule_img.html\"> " + directory + "</a>"
                 " (" + `img_cnt` + " images)<BR><BR></LI>\n")
 
-    # create the HTML main index footer
-    index_fd.write(
+    # append the HTML main index footer
+    index_parts.append(
         "\n</UL>\n\n<HR>\n"
         "<a href=\"http://www.tammura.at/eyemodule\">eyemodule.py</a> " + VERSION + " "
         "by Tamer Fahmy on " + time.asctime(time.localtime(time.time())) + \
         "\n\n</BODY>\n</HTML>")
 
+    # write the main index in one go through a large buffer
+    index_fd = open("eyemodule.html", "w", 1 << 20)
+    index_fd.write("".join(index_parts))
     index_fd.close()
     sys.stdout.write("done.\n")
 